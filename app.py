@@ -1,12 +1,38 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
+import io
+from concurrent.futures import ThreadPoolExecutor
 try:
     from PIL import Image
 except ImportError:
     Image = None
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# ============================================================================
+# TEXTOS ESTÁTICOS
+# ============================================================================
+INTRO_MD = """
+Esta aplicación muestra el análisis de temperaturas mínimas (Tmin) a nivel distrital en Perú,
+identificando zonas críticas para intervenciones de política pública.
+"""
+
+DOWNLOADS_MD = """
+    ### Archivos Disponibles
+    Descarga los datos procesados en formato CSV para análisis adicional.
+    """
+
+METADATA_MD = """
+    - **Fuente de datos:** Análisis de temperatura mínima 2024
+    - **Nivel territorial:** Distrital
+    - **Unidad:** Grados Celsius (°C)
+    - **Año de referencia:** 2024
+    - **Total de distritos analizados:** {n_distritos}
+    """
 
 # ============================================================================
 # CONFIGURACIÓN DE LA PÁGINA
@@ -21,14 +47,30 @@ st.set_page_config(
 # TÍTULO Y DESCRIPCIÓN
 # ============================================================================
 st.title("🌡️ Análisis de Temperatura Mínima en Perú — 2024")
-st.markdown("""
-Esta aplicación muestra el análisis de temperaturas mínimas (Tmin) a nivel distrital en Perú,
-identificando zonas críticas para intervenciones de política pública.
-""")
+st.markdown(INTRO_MD)
 
 # ============================================================================
 # CARGA DE DATOS
 # ============================================================================
+@st.cache_resource
+def file_presence():
+    """Comprueba una sola vez qué archivos de entrada existen"""
+    paths = (
+        'static_map.png',
+        'tmin_raster.tif',
+        'recorte.tif',
+        'tabla_mapa_tmin_2024.csv',
+        'ranking_top15_frio_2024.csv',
+        'ranking_top15_calor_2024.csv'
+    )
+    return {path: os.path.exists(path) for path in paths}
+
+def read_csv(filename):
+    """Lee un CSV con Polars (lector multihilo) si está disponible; pandas (motor pyarrow) si no"""
+    if pl is not None:
+        return pl.read_csv(filename).to_pandas()
+    return pd.read_csv(filename, engine='pyarrow')
+
 @st.cache_data
 def load_data():
     """Carga todos los archivos CSV necesarios"""
@@ -38,19 +80,157 @@ def load_data():
         'calor': 'ranking_top15_calor_2024.csv'
     }
     
+    # Lectura concurrente: el parseo libera el GIL, así que los archivos se solapan
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = {
+            key: executor.submit(read_csv, filename)
+            for key, filename in files.items()
+            if file_presence()[filename]
+        }
+    
     data = {}
     for key, filename in files.items():
-        if os.path.exists(filename):
-            data[key] = pd.read_csv(filename)
+        if key in futures:
+            data[key] = futures[key].result()
+            # Columnas numéricas (esquema estático): se calculan una vez al cargar
+            data[key].attrs['num_cols'] = list(data[key].select_dtypes(include=[np.number]).columns)
         else:
             st.warning(f"⚠️ Archivo no encontrado: {filename}")
             data[key] = None
     
-    return data
+    # Rankings ordenados una sola vez (más frío / más cálido primero)
+    for key, ascending in (('frio', True), ('calor', False)):
+        if data[key] is not None and 'mean' in data[key].columns:
+            data[key] = data[key].sort_values('mean', ascending=ascending, ignore_index=True)
+    
+    # Estadísticas agregadas: todas salen del arreglo ordenado de medias válidas
+    stats = None
+    if data['tabla_mapa'] is not None and 'mean' in data['tabla_mapa'].columns:
+        arr = data['tabla_mapa']['mean'].to_numpy(dtype=np.float64)
+        valid = arr[~np.isnan(arr)]
+        sorted_mean = np.sort(valid)
+        n_valid = sorted_mean.size
+        if n_valid == 0:
+            # Sin valores válidos: métricas en NaN y conteos en cero
+            mean_v = min_v = max_v = median_v = np.nan
+        else:
+            mid = n_valid // 2
+            mean_v = sorted_mean.mean()
+            min_v = sorted_mean[0]
+            max_v = sorted_mean[-1]
+            median_v = sorted_mean[mid] if n_valid % 2 else (sorted_mean[mid - 1] + sorted_mean[mid]) / 2
+        # Conteos por rango (<0, 0-4, 4-10, ≥10): búsqueda binaria de los límites
+        i0, i4, i10 = np.searchsorted(sorted_mean, [0, 4, 10], side='left')
+        # Histograma de 50 bins precalculado para el gráfico de distribución
+        hist_counts, hist_edges = np.histogram(sorted_mean, bins=50)
+        stats = {
+            'sorted_mean': sorted_mean,
+            'n': len(arr),
+            'mean': mean_v,
+            'min': min_v,
+            'max': max_v,
+            'median': median_v,
+            'lt0': int(i0),
+            'lt4': int(i4),
+            'bin_4_10': int(i10 - i4),
+            'ge10': int(n_valid - i10),
+            'hist_counts': hist_counts,
+            'hist_edges': hist_edges
+        }
+    
+    return data, stats
+
+def number_config(df: pd.DataFrame) -> dict:
+    """column_config de st.dataframe: columnas numéricas con 2 decimales"""
+    return {col: st.column_config.NumberColumn(format="%.2f") for col in df.attrs['num_cols']}
+
+@st.cache_data
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Serializa el DataFrame a CSV (UTF-8) para los botones de descarga"""
+    return df.to_csv(index=False).encode('utf-8')
+
+@st.cache_data
+def dept_summary(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Estadísticas de Tmin por departamento (un solo groupby), ordenadas por promedio"""
+    if pl is not None:
+        # group_by multihilo de Polars; solo el resultado (pequeño) vuelve a pandas
+        m = pl.col('mean')
+        return (
+            pl.from_pandas(df[[col, 'mean']])
+            .drop_nulls(col)  # pandas descarta las claves nulas al agrupar
+            .group_by(col)
+            .agg([
+                m.mean().alias('Promedio'),
+                m.min().alias('Mínimo'),
+                m.max().alias('Máximo'),
+                m.std().alias('Desv. Estándar'),
+                m.count().cast(pl.Int64).alias('N° Distritos')
+            ])
+            .sort('Promedio', nulls_last=True)
+            .to_pandas()
+            .set_index(col)
+            .round(2)
+        )
+    
+    g = df.groupby(col)['mean']
+    return g.agg(**{
+        'Promedio': 'mean',
+        'Mínimo': 'min',
+        'Máximo': 'max',
+        'Desv. Estándar': 'std',
+        'N° Distritos': 'count'
+    }).round(2).sort_values('Promedio')
+
+def pyplot():
+    """Importa matplotlib (backend Agg) solo cuando hay que dibujar una figura"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def fig_to_png(fig) -> bytes:
+    """Rasteriza la figura a PNG y la cierra"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+    pyplot().close(fig)
+    return buf.getvalue()
+
+@st.cache_data
+def hist_png(counts: np.ndarray, edges: np.ndarray, mean_v: float, median_v: float) -> bytes:
+    """Histograma (prebinado con np.histogram) de Tmin promedio por distrito (PNG)"""
+    fig, ax = pyplot().subplots(figsize=(12, 6))
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='steelblue', edgecolor='black', alpha=0.7)
+    ax.axvline(mean_v, color='red', linestyle='--', linewidth=2, label=f'Media: {mean_v:.2f}°C')
+    ax.axvline(median_v, color='green', linestyle='--', linewidth=2, label=f'Mediana: {median_v:.2f}°C')
+    ax.set_xlabel('Temperatura Mínima Promedio (°C)', fontsize=12)
+    ax.set_ylabel('Número de Distritos', fontsize=12)
+    ax.set_title('Distribución de Tmin Promedio por Distrito - Perú 2024', fontsize=14, fontweight='bold')
+    ax.legend()
+    ax.grid(alpha=0.3)
+    return fig_to_png(fig)
+
+@st.cache_data
+def dept_bar_png(dept_means: pd.Series) -> bytes:
+    """Barras horizontales de Tmin promedio por departamento (PNG)"""
+    fig, ax = pyplot().subplots(figsize=(12, 8))
+    dept_means.plot(kind='barh', ax=ax, color='coral')
+    ax.set_xlabel('Temperatura Mínima Promedio (°C)', fontsize=12)
+    ax.set_ylabel('Departamento', fontsize=12)
+    ax.set_title('Tmin Promedio por Departamento', fontsize=14, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3)
+    fig.tight_layout()
+    return fig_to_png(fig)
+
+@st.cache_resource
+def load_static_map(path):
+    """Abre y decodifica el mapa estático una sola vez"""
+    if Image is None:
+        return path
+    return Image.open(path).convert('RGB')
 
 # Cargar datos
 with st.spinner("Cargando datos..."):
-    data = load_data()
+    data, stats = load_data()
 
 # ============================================================================
 # SIDEBAR - FILTROS Y ESTADÍSTICAS
@@ -64,9 +244,9 @@ if data['tabla_mapa'] is not None:
     st.sidebar.metric("Total Distritos", len(df_main))
     
     if 'mean' in df_main.columns:
-        st.sidebar.metric("Tmin Promedio Nacional", f"{df_main['mean'].mean():.2f}°C")
-        st.sidebar.metric("Tmin Más Baja", f"{df_main['mean'].min():.2f}°C")
-        st.sidebar.metric("Tmin Más Alta", f"{df_main['mean'].max():.2f}°C")
+        st.sidebar.metric("Tmin Promedio Nacional", f"{stats['mean']:.2f}°C")
+        st.sidebar.metric("Tmin Más Baja", f"{stats['min']:.2f}°C")
+        st.sidebar.metric("Tmin Más Alta", f"{stats['max']:.2f}°C")
     
     # Filtro de umbral
     st.sidebar.markdown("---")
@@ -75,17 +255,17 @@ if data['tabla_mapa'] is not None:
     if 'mean' in df_main.columns:
         threshold = st.sidebar.slider(
             "Filtrar por temperatura (°C)",
-            float(df_main['mean'].min()),
-            float(df_main['mean'].max()),
-            (float(df_main['mean'].min()), float(df_main['mean'].max()))
+            float(stats['min']),
+            float(stats['max']),
+            (float(stats['min']), float(stats['max']))
         )
         
-        # Aplicar filtro
-        df_filtered = df_main[
-            (df_main['mean'] >= threshold[0]) & 
-            (df_main['mean'] <= threshold[1])
-        ]
-        st.sidebar.info(f"Mostrando {len(df_filtered)} distritos")
+        # Aplicar filtro (solo se necesita el conteo): búsqueda binaria, O(log N)
+        sorted_mean = stats['sorted_mean']
+        lo = np.searchsorted(sorted_mean, threshold[0], side='left')
+        hi = np.searchsorted(sorted_mean, threshold[1], side='right')
+        n_filtered = hi - lo
+        st.sidebar.info(f"Mostrando {n_filtered} distritos")
 
 # ============================================================================
 # TABS PRINCIPALES
@@ -104,8 +284,8 @@ with tab1:
     st.header("Mapa de Temperatura Mínima Promedio")
     
     # Mostrar mapa estático si existe
-    if os.path.exists("static_map.png"):
-        img = Image.open("static_map.png")
+    if file_presence()["static_map.png"]:
+        img = load_static_map("static_map.png")
         st.image(img, use_container_width=True, caption="Distribución espacial de Tmin en Perú (2024)")
     else:
         st.warning("⚠️ Imagen del mapa no encontrada: static_map.png")
@@ -119,11 +299,10 @@ with tab1:
         st.subheader("❄️ Top 15 Distritos Más Fríos")
         if data['frio'] is not None:
             st.dataframe(
-                data['frio'].style.format({
-                    col: "{:.2f}" for col in data['frio'].select_dtypes(include=[np.number]).columns
-                }),
+                data['frio'],
                 use_container_width=True,
-                height=400
+                height=400,
+                column_config=number_config(data['frio'])
             )
         else:
             st.error("No se pudo cargar el ranking de frío")
@@ -132,11 +311,10 @@ with tab1:
         st.subheader("🔥 Top 15 Distritos Más Cálidos")
         if data['calor'] is not None:
             st.dataframe(
-                data['calor'].style.format({
-                    col: "{:.2f}" for col in data['calor'].select_dtypes(include=[np.number]).columns
-                }),
+                data['calor'],
                 use_container_width=True,
-                height=400
+                height=400,
+                column_config=number_config(data['calor'])
             )
         else:
             st.error("No se pudo cargar el ranking de calor")
@@ -151,16 +329,10 @@ with tab2:
         st.header("Distribución de Temperaturas")
         
         # Histograma
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.hist(df_stats['mean'].dropna(), bins=50, color='steelblue', edgecolor='black', alpha=0.7)
-        ax.axvline(df_stats['mean'].mean(), color='red', linestyle='--', linewidth=2, label=f'Media: {df_stats["mean"].mean():.2f}°C')
-        ax.axvline(df_stats['mean'].median(), color='green', linestyle='--', linewidth=2, label=f'Mediana: {df_stats["mean"].median():.2f}°C')
-        ax.set_xlabel('Temperatura Mínima Promedio (°C)', fontsize=12)
-        ax.set_ylabel('Número de Distritos', fontsize=12)
-        ax.set_title('Distribución de Tmin Promedio por Distrito - Perú 2024', fontsize=14, fontweight='bold')
-        ax.legend()
-        ax.grid(alpha=0.3)
-        st.pyplot(fig)
+        st.image(
+            hist_png(stats['hist_counts'], stats['hist_edges'], stats['mean'], stats['median']),
+            use_container_width=True
+        )
         
         st.markdown("---")
         
@@ -170,27 +342,13 @@ with tab2:
             
             st.subheader("📍 Estadísticas por Departamento")
             
-            dept_stats = df_stats.groupby(dept_col)['mean'].agg([
-                ('Promedio', 'mean'),
-                ('Mínimo', 'min'),
-                ('Máximo', 'max'),
-                ('Desv. Estándar', 'std'),
-                ('N° Distritos', 'count')
-            ]).round(2).sort_values('Promedio')
+            dept_stats = dept_summary(df_stats, dept_col)
             
             st.dataframe(dept_stats, use_container_width=True)
             
             # Gráfico de barras por departamento
             st.subheader("Tmin Promedio por Departamento")
-            fig2, ax2 = plt.subplots(figsize=(12, 8))
-            dept_means = df_stats.groupby(dept_col)['mean'].mean().sort_values()
-            dept_means.plot(kind='barh', ax=ax2, color='coral')
-            ax2.set_xlabel('Temperatura Mínima Promedio (°C)', fontsize=12)
-            ax2.set_ylabel('Departamento', fontsize=12)
-            ax2.set_title('Tmin Promedio por Departamento', fontsize=14, fontweight='bold')
-            ax2.grid(axis='x', alpha=0.3)
-            plt.tight_layout()
-            st.pyplot(fig2)
+            st.image(dept_bar_png(dept_stats['Promedio']), use_container_width=True)
         
         st.markdown("---")
         
@@ -199,20 +357,20 @@ with tab2:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            bajo_cero = len(df_stats[df_stats['mean'] < 0])
-            st.metric("Distritos < 0°C", bajo_cero, delta=f"{(bajo_cero/len(df_stats)*100):.1f}%")
+            bajo_cero = stats['lt0']
+            st.metric("Distritos < 0°C", bajo_cero, delta=f"{(bajo_cero/stats['n']*100):.1f}%")
         
         with col2:
-            bajo_4 = len(df_stats[df_stats['mean'] < 4])
-            st.metric("Distritos < 4°C", bajo_4, delta=f"{(bajo_4/len(df_stats)*100):.1f}%")
+            bajo_4 = stats['lt4']
+            st.metric("Distritos < 4°C", bajo_4, delta=f"{(bajo_4/stats['n']*100):.1f}%")
         
         with col3:
-            rango_frio = len(df_stats[(df_stats['mean'] >= 4) & (df_stats['mean'] < 10)])
-            st.metric("Distritos 4-10°C", rango_frio, delta=f"{(rango_frio/len(df_stats)*100):.1f}%")
+            rango_frio = stats['bin_4_10']
+            st.metric("Distritos 4-10°C", rango_frio, delta=f"{(rango_frio/stats['n']*100):.1f}%")
         
         with col4:
-            templado = len(df_stats[df_stats['mean'] >= 10])
-            st.metric("Distritos ≥ 10°C", templado, delta=f"{(templado/len(df_stats)*100):.1f}%")
+            templado = stats['ge10']
+            st.metric("Distritos ≥ 10°C", templado, delta=f"{(templado/stats['n']*100):.1f}%")
 
 # ============================================================================
 # TAB 4: DATOS Y DESCARGAS
@@ -220,18 +378,20 @@ with tab2:
 with tab4:
     st.header("💾 Datos y Descargas")
     
-    st.markdown("""
-    ### Archivos Disponibles
-    Descarga los datos procesados en formato CSV para análisis adicional.
-    """)
+    st.markdown(DOWNLOADS_MD)
     
     # Tabla completa
     if data['tabla_mapa'] is not None:
         st.subheader("📋 Tabla Completa de Datos")
-        st.dataframe(data['tabla_mapa'], use_container_width=True, height=400)
+        st.dataframe(
+            data['tabla_mapa'],
+            use_container_width=True,
+            height=400,
+            column_config=number_config(data['tabla_mapa'])
+        )
         
         # Botón de descarga
-        csv = data['tabla_mapa'].to_csv(index=False).encode('utf-8')
+        csv = to_csv_bytes(data['tabla_mapa'])
         st.download_button(
             label="⬇️ Descargar Tabla Completa (CSV)",
             data=csv,
@@ -246,7 +406,7 @@ with tab4:
     
     with col1:
         if data['frio'] is not None:
-            csv_frio = data['frio'].to_csv(index=False).encode('utf-8')
+            csv_frio = to_csv_bytes(data['frio'])
             st.download_button(
                 label="⬇️ Descargar Ranking Frío (CSV)",
                 data=csv_frio,
@@ -256,7 +416,7 @@ with tab4:
     
     with col2:
         if data['calor'] is not None:
-            csv_calor = data['calor'].to_csv(index=False).encode('utf-8')
+            csv_calor = to_csv_bytes(data['calor'])
             st.download_button(
                 label="⬇️ Descargar Ranking Calor (CSV)",
                 data=csv_calor,
@@ -270,9 +430,9 @@ with tab4:
     st.subheader("🗺️ Datos Raster")
     
     raster_info = []
-    if os.path.exists("tmin_raster.tif"):
+    if file_presence()["tmin_raster.tif"]:
         raster_info.append("✅ tmin_raster.tif - Raster completo")
-    if os.path.exists("recorte.tif"):
+    if file_presence()["recorte.tif"]:
         raster_info.append("✅ recorte.tif - Raster recortado")
     
     if raster_info:
@@ -285,13 +445,9 @@ with tab4:
     
     # Metadatos
     st.subheader("ℹ️ Metadatos")
-    st.markdown("""
-    - **Fuente de datos:** Análisis de temperatura mínima 2024
-    - **Nivel territorial:** Distrital
-    - **Unidad:** Grados Celsius (°C)
-    - **Año de referencia:** 2024
-    - **Total de distritos analizados:** """ + (str(len(data['tabla_mapa'])) if data['tabla_mapa'] is not None else "N/A") + """
-    """)
+    st.markdown(METADATA_MD.format(
+        n_distritos=len(data['tabla_mapa']) if data['tabla_mapa'] is not None else "N/A"
+    ))
 
 # ============================================================================
 # FOOTER